@@ -1,6 +1,7 @@
 from telegram.ext import CallbackContext,Handler,Filters,Dispatcher,Updater,CommandHandler,MessageHandler,MessageFilter,BaseFilter,Filters
 from telegram import InlineQueryResultArticle, InputTextMessageContent, KeyboardButton, ReplyKeyboardMarkup,InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackQueryHandler
+from cachetools import TTLCache
 import os
 PORT = int(os.environ.get('PORT', '8443'))
 import datetime
@@ -16,6 +17,7 @@ ADMINS = {
     'NARENGI':'133473427',
     'NABAT':'5182966885',
 }
+ADMIN_NAMES = {int(v):k for k,v in ADMINS.items()}
 
 KEYS = {
     'NARENGI':'🍊',
@@ -23,176 +25,141 @@ KEYS = {
     # 'HARDO':'باهم.',
     'LAGHV':'👈🏻',
 }
-BANLIST = []
-LASTS = {
-
+NAMES = {
+    KEYS['NARENGI']:('NARENGI','نارنگی🍊'),
+    KEYS['NABAT']:('NABAT','نبات🪴'),
 }
+NEW_USER_TEXT = """ یه نفر جدید ربات رو استارت زد:
+    name = {name}
+    username = {username}
+    url = {url}
+        """
+WELCOME_TEXT = '''
+        سلام. ^^ 
+    به ربات ما خوش اومدی، لطفا برای پیام دادن از کلیدهای زیر استفاده کن.
+    🍊 برای پیام دادن به نارنگی؛
+    🪴 برای پیام دادن به نبات.'''
+TO_TEXT = '''
+در حال پیام دادن به {name} هستی. 
+لطفا متن، عکس، آهنگ یا هرچیز دیگه‎ای که دوست داری رو برام بفرست.
+
+برای برگشت از دستور 👈🏻 استفاده کن.  ^^'''
+LAGHV_TEXT = "به صفحه اصلی برگشتی. :'("
+LAGHV_ADMIN_TEXT = "به صفحه اصلی بازگشتید."
+SENT_TEXT = 'پیام شما ارسال شد. '
+UNKNOWN_TEXT = 'متوجه نشدم باید چیکار کنم.'
+MAIN_MENU = ReplyKeyboardMarkup([
+    # [KeyboardButton(KEYS['HARDO'])],
+    [KeyboardButton(KEYS['NABAT']), KeyboardButton(KEYS['NARENGI'])]], resize_keyboard=True)
+LAGHV_MENU = ReplyKeyboardMarkup([[KeyboardButton(KEYS['LAGHV'])]], resize_keyboard=True)
+ADMIN_MENU = ReplyKeyboardMarkup([[]], resize_keyboard=True)
+BANLIST = set()
+# the chosen recipient is dropped after a day so abandoned chats don't pile up
+LASTS = TTLCache(maxsize=10000, ttl=24 * 60 * 60)
 LASTSADMINS = {
 
 }
 def start(update:Updater,context:CallbackContext):
     id = update.effective_chat.id
-    admin = False
-    admins = ''
-    for i in ADMINS:
-        if str(id) == ADMINS[i]:
-            admin = True
-            admins = i
-    if admin:
+    admins = ADMIN_NAMES.get(id)
+    if admins is not None:
         context.bot.send_message(chat_id=id,text=f'سلام {admins} .=)')
     else:
-        name = ''
         # {'last_name': '\u200c\u200cAmani', 'id': 133473427, 'first_name': '\u200c\u200c\u200c\u200cMohaّmadreza', 'type': 'private'}
-        # for i in ADMINS:
-        name = ''
-        last_name = ''
-        username = ''
+        chat = update.effective_chat
         url = 'tg://openmessage?user_id=%d'%id
-        try:
-            name = update.effective_chat.first_name
-        except:
-            pass
-        try:
-            last_name = update.effective_chat.last_name
-        except:
-            pass
-        try:
-            username = '@' + update.effective_chat.username
-        except:
-            pass
-        text = f""" یه نفر جدید ربات رو استارت زد:
-    name = {name + ' ' +last_name}
-    username = {username}
-    url = {url}
-        """
-        for i in ADMINS:
-            context.bot.send_message(chat_id=ADMINS[i],text=text)
-        welcome ='''
-        سلام. ^^ 
-    به ربات ما خوش اومدی، لطفا برای پیام دادن از کلیدهای زیر استفاده کن.
-    🍊 برای پیام دادن به نارنگی؛
-    🪴 برای پیام دادن به نبات.'''
-        buttons = [
-        # [KeyboardButton(KEYS['HARDO'])],
-        [KeyboardButton(KEYS['NABAT']), KeyboardButton(KEYS['NARENGI'])]]
-        reply_markup = ReplyKeyboardMarkup(buttons, resize_keyboard=True)
-        context.bot.send_message(chat_id=id,text=welcome,reply_markup=reply_markup)
+        name = getattr(chat, 'first_name', '') or ''
+        last_name = getattr(chat, 'last_name', '') or ''
+        username = getattr(chat, 'username', '') or ''
+        if username:
+            username = '@' + username
+        text = NEW_USER_TEXT.format(name=name + ' ' +last_name,username=username,url=url)
+        # notify the admins in parallel on the dispatcher's worker pool
+        for admin_id in ADMINS.values():
+            context.dispatcher.run_async(context.bot.send_message,chat_id=admin_id,text=text)
+        context.bot.send_message(chat_id=id,text=WELCOME_TEXT,reply_markup=MAIN_MENU)
 def laghv(update:Updater,context:CallbackContext,text,id):
-    matn = "به صفحه اصلی برگشتی. :'("
-    buttons = [
-    # [KeyboardButton(KEYS['HARDO'])],
-    [KeyboardButton(KEYS['NABAT']), KeyboardButton(KEYS['NARENGI'])]]
-    reply_markup = ReplyKeyboardMarkup(buttons, resize_keyboard=True)
-    context.bot.send_message(chat_id=id,text=matn,reply_markup=reply_markup)
+    context.bot.send_message(chat_id=id,text=LAGHV_TEXT,reply_markup=MAIN_MENU)
 def laghv_admin(update:Updater,context:CallbackContext,text,id):
-    matn = "به صفحه اصلی بازگشتید."
-    buttons = [
-    []]
-    reply_markup = ReplyKeyboardMarkup(buttons, resize_keyboard=True)
-    context.bot.send_message(chat_id=id,text=matn,reply_markup=reply_markup)
+    context.bot.send_message(chat_id=id,text=LAGHV_ADMIN_TEXT,reply_markup=ADMIN_MENU)
 def admin():
     pass
 def to(update:Updater,context:CallbackContext,text,id):
-    
-    if text == '🍊':
-        name = 'نارنگی🍊'
-        LASTS[id] = 'NARENGI'
-    else:
-        name = 'نبات🪴'
-        LASTS[id] = 'NABAT'
-    matn = f'''
-در حال پیام دادن به {name} هستی. 
-لطفا متن، عکس، آهنگ یا هرچیز دیگه‎ای که دوست داری رو برام بفرست.
-
-برای برگشت از دستور 👈🏻 استفاده کن.  ^^'''
-    buttons = [
-    [KeyboardButton(KEYS['LAGHV'])]]
-    reply_markup = ReplyKeyboardMarkup(buttons, resize_keyboard=True)
-    context.bot.send_message(chat_id=id,text=matn,reply_markup=reply_markup)
+    LASTS[id], name = NAMES[text]
+    context.bot.send_message(chat_id=id,text=TO_TEXT.format(name=name),reply_markup=LAGHV_MENU)
 def toAdmin(update:Updater,context:CallbackContext, admin, message):
     id = ADMINS[admin]
     senderID = update.effective_chat.id
-    buttons = [
-    [KeyboardButton(KEYS['LAGHV'])]]
-    reply_markup = ReplyKeyboardMarkup(buttons, resize_keyboard=True)
-    matn = 'پیام شما ارسال شد. '
-    context.bot.send_message(chat_id=senderID,text=matn,reply_markup=reply_markup)
-    mid = context.bot.forward_message(chat_id=id,from_chat_id=senderID,message_id= message.message_id).message_id
+    context.bot.send_message(chat_id=senderID,text=SENT_TEXT,reply_markup=LAGHV_MENU)
     if senderID not in BANLIST:
-        keyboard = [
-                    [InlineKeyboardButton("نمایش اطلاعات", callback_data=f'show_{senderID}')],
-                    [InlineKeyboardButton("مسدود کردن", callback_data=f'ban_{senderID}')],
-                    [InlineKeyboardButton("پاسخ دادن", callback_data=f'answer_{senderID}')]
-                ]
+        ban = InlineKeyboardButton("مسدود کردن", callback_data=f'ban_{senderID}')
     else:
-        keyboard = [
-                    [InlineKeyboardButton("نمایش اطلاعات", callback_data=f'show_{senderID}')],
-                    [InlineKeyboardButton("لفو مسدودیت", callback_data=f'unban_{senderID}')],
-                    [InlineKeyboardButton("پاسخ دادن", callback_data=f'answer_{senderID}')]
-                ]
+        ban = InlineKeyboardButton("لفو مسدودیت", callback_data=f'unban_{senderID}')
+    keyboard = [
+                [InlineKeyboardButton("نمایش اطلاعات", callback_data=f'show_{senderID}')],
+                [ban],
+                [InlineKeyboardButton("پاسخ دادن", callback_data=f'answer_{senderID}')]
+            ]
     reply_markup = InlineKeyboardMarkup(keyboard)
-    context.bot.send_message(chat_id=id,text='اطلاعات کاربر', reply_markup=reply_markup)
-def from_admin(update:Updater,context:CallbackContext):
+    # one call: the admin gets the user's message with the action buttons attached
+    context.bot.copy_message(chat_id=id,from_chat_id=senderID,message_id=message.message_id,reply_markup=reply_markup)
+def from_admin(update:Updater,context:CallbackContext,getterID):
     id = update.effective_chat.id
-    getterID = LASTSADMINS[str(id)]
-    # LASTSADMINS.pop[str(id)]
+    # LASTSADMINS.pop[id]
     message = update.message.message_id
     context.bot.copyMessage(chat_id=getterID,from_chat_id=id,message_id=message)
     context.bot.send_message(chat_id=id,text='پیام شما با موفقیت ارسال شد.')
-    buttons = [
-    [KeyboardButton(KEYS['LAGHV'])]]
-    reply_markup = ReplyKeyboardMarkup(buttons, resize_keyboard=True)
 
 def sendMessage(update:Updater,context:CallbackContext):
     id = update.effective_chat.id
-    admin = False
-    for i in ADMINS:
-        if str(id) == ADMINS[i]:
-            admin = True
-    if admin:
+    if id in ADMIN_NAMES:
         text = update.message.text
+        getterID = LASTSADMINS.get(id)
         if text == '👈🏻':
             laghv_admin(update,context,text,id)
-        elif str(id) not in LASTSADMINS:
-            context.bot.send_message(chat_id=id,text='متوجه نشدم باید چیکار کنم.')
+        elif getterID is None:
+            context.bot.send_message(chat_id=id,text=UNKNOWN_TEXT)
         else:
-            from_admin(update,context)
+            from_admin(update,context,getterID)
     else:
         if id in BANLIST:
             context.bot.send_message(chat_id=id,text='شما مسدود هستید.')
             return
         text = update.message.text
-        if text == '🍊' or text == '🪴':
+        if text in NAMES:
             to(update,context,text,id)
         elif text == '👈🏻':
             laghv(update,context,text,id)
-        elif id in LASTS:
-            if LASTS[id] == 'NABAT':
-                toAdmin(update,context, 'NABAT', update.message)
-            elif LASTS[id] == 'NARENGI':
-                toAdmin(update,context, 'NARENGI', update.message)
-            elif str(id) not in LASTS:
-                context.bot.send_message(chat_id=id,text='متوجه نشدم باید چیکار کنم.')
+        else:
+            last = LASTS.get(id)
+            if last is None:
+                context.bot.send_message(chat_id=id,text=UNKNOWN_TEXT)
+            else:
+                toAdmin(update,context, last, update.message)
 def press_button_callback(update:Updater,context:CallbackContext):
-    data:str = update.callback_query.data
-    id = update.callback_query.message.chat.id
-    if data.startswith('show'):
-        context.bot.send_message(chat_id=id,text='tg://openmessage?user_id='+data.split('_')[1])
-    if data.startswith('ban'):
+    query = update.callback_query
+    # stop the client's loading spinner before doing any work
+    query.answer()
+    data:str = query.data
+    id = query.message.chat.id
+    action, _, user_id = data.partition('_')
+    if action == 'show':
+        context.bot.send_message(chat_id=id,text='tg://openmessage?user_id='+user_id)
+    elif action == 'ban':
         context.bot.send_message(chat_id=id,text='یوزر مورد نظر بن شد. :(')
-        BANLIST.append(data.split('_')[1])
-    if data.startswith('unban'):
+        BANLIST.add(int(user_id))
+    elif action == 'unban':
         context.bot.send_message(chat_id=id,text='یوزر مورد نظر از مسدودیت خارج شد.')
-        BANLIST.remove(data.split('_')[1])
-    if data.startswith('answer'):
+        BANLIST.discard(int(user_id))
+    elif action == 'answer':
         context.bot.send_message(chat_id=id,text='داری به نمیدونم کی کی پاسخ میدی. لطفا متنت رو بفرست.')
-        LASTSADMINS[str(id)]=data.split('_')[1]
+        LASTSADMINS[id]=int(user_id)
 def main():
     dispatcher = update.dispatcher
     startHandler = CommandHandler('start',start)
     dispatcher.add_handler(startHandler)
     dispatcher.add_handler(MessageHandler(Filters.all,sendMessage))
-    update.dispatcher.add_handler(CallbackQueryHandler(press_button_callback))
+    update.dispatcher.add_handler(CallbackQueryHandler(press_button_callback,run_async=True))
     update.start_webhook(
             listen="0.0.0.0",
             port=int(PORT),